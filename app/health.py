@@ -0,0 +1,82 @@
+import asyncio
+import os
+import sqlite3
+from typing import Dict
+
+import aiohttp
+from minio import Minio
+
+from app.logging_config import get_logger
+from app.shared_state import aget_value, aset_value
+
+logger = get_logger("health")
+
+# External providers the app depends on; any HTTP response counts as reachable
+PROVIDER_URLS = {
+    "anthropic": "https://api.anthropic.com",
+    "elevenlabs": "https://api.elevenlabs.io",
+    "fal": "https://fal.run",
+}
+CHECK_TIMEOUT = float(os.getenv("READINESS_CHECK_TIMEOUT", "3"))
+# Probe results are shared across workers so load balancer probes don't fan out
+READINESS_CACHE_TTL = float(os.getenv("READINESS_CACHE_TTL", "10"))
+READINESS_CACHE_KEY = "health:readiness"
+
+
+def _check_minio_sync() -> None:
+    minio_client = Minio(
+        os.getenv("MINIO_ENDPOINT", "minio:9000"),
+        access_key=os.getenv("MINIO_ACCESS_KEY"),
+        secret_key=os.getenv("MINIO_SECRET_KEY"),
+        secure=True,
+    )
+    minio_client.list_buckets()
+
+
+async def check_minio() -> str:
+    try:
+        await asyncio.wait_for(asyncio.to_thread(_check_minio_sync), CHECK_TIMEOUT)
+        return "ok"
+    except Exception as e:
+        logger.warning(f"MinIO readiness check failed: {e!r}")
+        return "error"
+
+
+async def check_provider(session: aiohttp.ClientSession, url: str) -> str:
+    try:
+        async with session.head(url, allow_redirects=False):
+            return "ok"
+    except Exception as e:
+        logger.warning(f"Provider readiness check failed for {url}: {e!r}")
+        return "error"
+
+
+async def check_readiness() -> Dict[str, str]:
+    """Check MinIO and provider reachability, reusing a recent result if any.
+
+    Results are plain "ok"/"error" since the endpoint is unauthenticated;
+    details only go to the log.
+    """
+    try:
+        cached = await aget_value(READINESS_CACHE_KEY)
+    except sqlite3.Error as e:
+        logger.warning(f"Shared state readiness check failed: {e!r}")
+        return {"shared_state": "error"}
+    if cached is not None:
+        return cached
+
+    timeout = aiohttp.ClientTimeout(total=CHECK_TIMEOUT)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        names = ["minio", *PROVIDER_URLS]
+        results = await asyncio.gather(
+            check_minio(),
+            *(check_provider(session, url) for url in PROVIDER_URLS.values()),
+        )
+    checks = dict(zip(names, results))
+
+    try:
+        await aset_value(READINESS_CACHE_KEY, checks, ttl=READINESS_CACHE_TTL)
+    except sqlite3.Error as e:
+        logger.warning(f"Shared state readiness check failed: {e!r}")
+        checks["shared_state"] = "error"
+    return checks
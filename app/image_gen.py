@@ -144,6 +144,23 @@ async def generate_prompt(imageGen: ImageGenerationRequest) -> ImagePrompt:
         raise e
 
 
+def render_comfy_workflow(
+    workflow: dict,
+    prompt: ImagePrompt,
+    positive_placeholder: str,
+    negative_placeholder: str,
+) -> str:
+    """Substitute the generated prompts into a ComfyUI workflow and return its JSON"""
+    workflow_json = json.dumps(workflow)
+    workflow_json = workflow_json.replace(
+        positive_placeholder, json.dumps(prompt.positive)[1:-1]
+    )
+    workflow_json = workflow_json.replace(
+        negative_placeholder, json.dumps(prompt.negative)[1:-1]
+    )
+    return workflow_json
+
+
 async def upload_to_minio(file_path: str) -> str:
     """Upload file to MinIO and return presigned URL"""
     try:
@@ -251,8 +268,8 @@ async def generate_image_comfy(workflow: str) -> ImageResponse:
         with open(workflow_file, "w") as f:
             f.write(workflow)
 
-        # Run workflow and get image paths
-        image_paths = run_workflow(workflow_file)
+        # Run workflow and get image paths; the CLI blocks until the render is done
+        image_paths = await asyncio.to_thread(run_workflow, workflow_file)
 
         # Upload images to MinIO in parallel
         urls = []
@@ -50,3 +50,20 @@ async def process_chat(chat_data: NewChatMessage) -> LLMResponse:
         error_msg = f"Error in process_chat: {str(e)}"
         logger.error(error_msg)
         raise e
+
+
+def build_user_message(chat_data: NewChatMessage) -> LLMMessage:
+    """
+    Echo the user's turn as a message, noting any selected keywords
+    """
+    return LLMMessage(
+        author=chat_data.author,
+        content=(
+            f"{chat_data.content}"
+            + (
+                f'\n\n* Selected Keywords: {", ".join(chat_data.selectedKeywords)} *'
+                if chat_data.selectedKeywords
+                else ""
+            )
+        ).strip(),
+    )
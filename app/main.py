@@ -2,24 +2,36 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, WebSocket
 from fastapi.templating import Jinja2Templates
 from app.logging_config import get_logger, setup_logging
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from app.models import (
     ComfyWorkflowRequest,
     ImageResponse,
-    LLMMessage,
     NewChatMessage,
     ImageGenerationRequest,
 )
-from app.llm import process_chat
-from app.image_gen import generate_image, generate_image_comfy, generate_prompt
+from app.llm import build_user_message, process_chat
+from app.image_gen import (
+    generate_image,
+    generate_image_comfy,
+    generate_prompt,
+    render_comfy_workflow,
+)
 from app.logging_config import setup_logging
-import json
-from app.models import AudioGenerationRequest, AudioResponse
+from typing import Optional
+from app.models import (
+    AudioGenerationRequest,
+    AudioResponse,
+    NarrationRequest,
+    NarrationResponse,
+)
 from app.audio_gen import generate_audio
+from app.narration import narrate_turn
+from app.story_channel import story_channel
+from app.health import check_readiness
 from fastapi.middleware.cors import CORSMiddleware
 
 
@@ -53,6 +65,23 @@ async def root(request: Request):
     )
 
 
+@app.get("/health/live")
+async def liveness():
+    """Report that this worker process is up and serving requests"""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """Report whether MinIO and the AI providers are reachable"""
+    checks = await check_readiness()
+    is_ready = all(result == "ok" for result in checks.values())
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"status": "ok" if is_ready else "unavailable", "checks": checks},
+    )
+
+
 @app.post("/api/chat")
 async def chat(chat_message: NewChatMessage):
     try:
@@ -62,20 +91,7 @@ async def chat(chat_message: NewChatMessage):
 
         logger.info(f"Generated response")
 
-        response.messages.insert(
-            0,
-            LLMMessage(
-                author=chat_message.author,
-                content=(
-                    f"{chat_message.content}"
-                    + (
-                        f'\n\n* Selected Keywords: {", ".join(chat_message.selectedKeywords)} *'
-                        if chat_message.selectedKeywords
-                        else ""
-                    )
-                ).strip(),
-            ),
-        )
+        response.messages.insert(0, build_user_message(chat_message))
 
         return {
             "llm_response": {
@@ -106,12 +122,11 @@ async def generate_image_endpoint(comfyGen: ComfyWorkflowRequest):
     try:
         logger.info(f"Received image generation request")
         prompt = await generate_prompt(ImageGenerationRequest(**comfyGen.model_dump()))
-        workflow_json = json.dumps(comfyGen.workflow)
-        workflow_json = workflow_json.replace(
-            comfyGen.positivePromptPlaceholder, json.dumps(prompt.positive)[1:-1]
-        )
-        workflow_json = workflow_json.replace(
-            comfyGen.negativePromptPlaceholder, json.dumps(prompt.negative)[1:-1]
+        workflow_json = render_comfy_workflow(
+            comfyGen.workflow,
+            prompt,
+            comfyGen.positivePromptPlaceholder,
+            comfyGen.negativePromptPlaceholder,
         )
         urls = await generate_image_comfy(workflow_json)
         logger.info(f"Generated image response: {urls}")
@@ -126,6 +141,24 @@ async def generate_audio_endpoint(request: AudioGenerationRequest):
     return await generate_audio(request.text)
 
 
+@app.post("/api/narration/generate", response_model=NarrationResponse)
+async def generate_narration_endpoint(request: NarrationRequest):
+    try:
+        logger.info(f"Received narration request for {len(request.messages)} messages")
+        return await narrate_turn(request)
+    except Exception as e:
+        logger.error(f"Error generating narration: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.websocket("/ws/story/{session_id}")
+async def story_websocket(
+    websocket: WebSocket, session_id: str, last_seq: int = 0, epoch: Optional[str] = None
+):
+    """Multiplex chat, image and audio events for one story session"""
+    await story_channel(websocket, session_id, last_seq, epoch)
+
+
 if __name__ == "__main__":
     import nest_asyncio
     from pyngrok import ngrok
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Literal, Optional
+from typing import Dict, List, Literal, Optional
 
 
 class LLMKeyword(BaseModel):
@@ -94,3 +94,74 @@ class AudioGenerationRequest(BaseModel):
 
 class AudioResponse(BaseModel):
     url: str
+
+
+# Meta-commentary and errors are not read aloud unless asked for
+NARRATION_SKIP_AUTHORS = ["thoughts", "system"]
+
+
+class NarrationRequest(BaseModel):
+    messages: List[Message]
+    voices: Dict[str, str] = Field(
+        default_factory=dict,
+        description="Author name to ElevenLabs voice ID; falls back to NARRATION_VOICE_MAP and ELEVEN_VOICE_ID",
+    )
+    stitch: Literal["none", "message", "turn"] = Field(
+        default="message",
+        description="Clip granularity: one per sentence chunk, one per message, or one for the whole turn",
+    )
+    skipAuthors: List[str] = Field(default_factory=lambda: list(NARRATION_SKIP_AUTHORS))
+
+
+class NarrationClip(BaseModel):
+    url: str
+    text: str
+    author: Optional[str] = None
+    messageIndex: Optional[int] = Field(
+        default=None, description="Index into the request messages; None for a whole-turn clip"
+    )
+
+
+class NarrationResponse(BaseModel):
+    playlist: List[NarrationClip] = Field(
+        description="Clips in playback order; clips that failed to synthesize are omitted"
+    )
+
+
+class StorySessionConfig(BaseModel):
+    storytellerPrompt: Optional[str] = Field(default="")
+    imagePrompt: Optional[str] = Field(default="")
+    imageMode: Literal["regular", "comfy"] = "regular"
+    workflow: dict = Field(default_factory=dict, description="ComfyUI workflow configuration")
+    positivePromptPlaceholder: str = "{positive_prompt}"
+    negativePromptPlaceholder: str = "{negative_prompt}"
+    narrate: bool = Field(default=True, description="Pre-synthesize audio for every turn")
+    voices: Dict[str, str] = Field(default_factory=dict)
+
+
+class StoryConfigureCommand(BaseModel):
+    """Sent once per session, and again when the config or history is edited"""
+
+    type: Literal["configure"]
+    config: StorySessionConfig
+    history: List[Message] = Field(default_factory=list)
+    imageHistory: List[dict] = Field(default_factory=list)
+    baseVersion: int = Field(
+        default=0,
+        description="Session version the snapshot was taken at; stale snapshots are rejected",
+    )
+    requestId: Optional[str] = Field(
+        default=None, description="Echoed back so the sender can match the reply"
+    )
+
+
+class StoryTurnCommand(BaseModel):
+    type: Literal["turn"]
+    content: str
+    author: str
+    selectedKeywords: List[str] = Field(default_factory=list)
+    generateImage: bool = True
+
+
+class StoryImageCommand(BaseModel):
+    type: Literal["image"]
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import os
+import re
+from itertools import groupby
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from app.audio_gen import synthesize_speech, upload_audio
+from app.logging_config import get_logger
+from app.models import NarrationClip, NarrationRequest, NarrationResponse
+
+logger = get_logger("narration")
+
+# Sentences are merged into chunks up to this many characters
+NARRATION_CHUNK_CHARS = int(os.getenv("NARRATION_CHUNK_CHARS", "250"))
+# Max concurrent ElevenLabs calls per worker, shared by all requests
+NARRATION_CONCURRENCY = int(os.getenv("NARRATION_CONCURRENCY", "4"))
+
+_tts_semaphore = asyncio.Semaphore(NARRATION_CONCURRENCY)
+
+# Whitespace after terminal punctuation, optionally followed by a closing quote
+_SENTENCE_END = re.compile(r"(?:(?<=[.!?…])|(?<=[.!?…][\"'”’)\]*]))\s+")
+# Titles whose period doesn't end a sentence, so "Mr. Smith" stays together
+_ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "prof.", "st.", "sr.", "jr.", "capt.", "lt."}
+
+
+class NarrationSegment(BaseModel):
+    """A sentence chunk of one message, ready to synthesize"""
+
+    message_index: int
+    author: str
+    voice_id: Optional[str]
+    text: str
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences on terminal punctuation"""
+    sentences = []
+    for piece in _SENTENCE_END.split(text.strip()):
+        piece = piece.strip()
+        if not piece:
+            continue
+        if sentences and sentences[-1].split()[-1].lower() in _ABBREVIATIONS:
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        else:
+            sentences.append(piece)
+    return sentences
+
+
+def chunk_text(text: str, max_chars: int = NARRATION_CHUNK_CHARS) -> List[str]:
+    """Group consecutive sentences into chunks of at most max_chars.
+
+    A single sentence longer than max_chars becomes its own chunk.
+    """
+    chunks = []
+    current = ""
+    for sentence in split_sentences(text):
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _default_voice_map() -> Dict[str, str]:
+    """Read the NARRATION_VOICE_MAP env var, a JSON object of author to voice ID"""
+    try:
+        voices = json.loads(os.getenv("NARRATION_VOICE_MAP") or "{}")
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid NARRATION_VOICE_MAP: {e}")
+        return {}
+    if not isinstance(voices, dict) or not all(
+        isinstance(author, str) and isinstance(voice_id, str)
+        for author, voice_id in voices.items()
+    ):
+        logger.error("Invalid NARRATION_VOICE_MAP: expected a JSON object of strings")
+        return {}
+    return {author.lower(): voice_id for author, voice_id in voices.items()}
+
+
+def build_segments(request: NarrationRequest) -> List[NarrationSegment]:
+    voices = {
+        **_default_voice_map(),
+        **{author.lower(): voice_id for author, voice_id in request.voices.items()},
+    }
+    skip_authors = {author.lower() for author in request.skipAuthors}
+
+    segments = []
+    for index, message in enumerate(request.messages):
+        if message.author.lower() in skip_authors:
+            continue
+        for chunk in chunk_text(message.content):
+            segments.append(
+                NarrationSegment(
+                    message_index=index,
+                    author=message.author,
+                    voice_id=voices.get(message.author.lower()),
+                    text=chunk,
+                )
+            )
+    return segments
+
+
+async def _synthesize(segment: NarrationSegment) -> bytes:
+    async with _tts_semaphore:
+        return await asyncio.to_thread(synthesize_speech, segment.text, segment.voice_id)
+
+
+async def _render_clip(
+    segments: List[NarrationSegment], audio: List[bytes], is_whole_turn: bool
+) -> NarrationClip:
+    # All chunks share one MP3 format, so frames can be concatenated as-is
+    url = await asyncio.to_thread(upload_audio, b"".join(audio))
+    authors = {segment.author for segment in segments}
+    return NarrationClip(
+        url=url,
+        text=" ".join(segment.text for segment in segments),
+        author=authors.pop() if len(authors) == 1 else None,
+        messageIndex=None if is_whole_turn else segments[0].message_index,
+    )
+
+
+async def narrate_turn(request: NarrationRequest) -> NarrationResponse:
+    """Synthesize every message of a turn in sentence chunks, concurrently"""
+    segments = build_segments(request)
+    if not segments:
+        return NarrationResponse(playlist=[])
+
+    logger.info(
+        f"Narrating {len(segments)} chunks from {len(request.messages)} messages (stitch={request.stitch})"
+    )
+    # One failed chunk must not discard the rest of the turn
+    audio = await asyncio.gather(
+        *(_synthesize(segment) for segment in segments), return_exceptions=True
+    )
+    rendered = list(zip(segments, audio))
+
+    if request.stitch == "none":
+        groups = [[item] for item in rendered]
+    elif request.stitch == "message":
+        groups = [
+            list(items)
+            for _, items in groupby(rendered, key=lambda item: item[0].message_index)
+        ]
+    else:
+        groups = [rendered]
+
+    # Drop clips with a missing chunk rather than stitching truncated audio
+    errors = [chunk for _, chunk in rendered if isinstance(chunk, BaseException)]
+    complete_groups = [
+        group for group in groups if not any(isinstance(chunk, BaseException) for _, chunk in group)
+    ]
+    if errors:
+        logger.error(
+            f"Failed to synthesize {len(errors)} of {len(segments)} chunks, "
+            f"dropping {len(groups) - len(complete_groups)} clips: {errors[0]!r}"
+        )
+
+    results = await asyncio.gather(
+        *(
+            _render_clip(
+                [segment for segment, _ in group],
+                [chunk for _, chunk in group],
+                is_whole_turn=request.stitch == "turn",
+            )
+            for group in complete_groups
+        ),
+        return_exceptions=True,
+    )
+    playlist = [clip for clip in results if isinstance(clip, NarrationClip)]
+    errors += [clip for clip in results if isinstance(clip, BaseException)]
+    if len(playlist) < len(results):
+        logger.error(f"Failed to upload {len(results) - len(playlist)} clips")
+
+    if errors and not playlist:
+        raise errors[0]
+
+    logger.info(f"Narration ready: {len(playlist)} of {len(groups)} clips")
+    return NarrationResponse(playlist=playlist)
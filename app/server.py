@@ -0,0 +1,60 @@
+"""Production launcher: multiple uvicorn workers sharing state through SQLite.
+
+Usage: python -m app.server [--workers N] [--host HOST] [--port PORT]
+"""
+
+import argparse
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import uvicorn
+
+from app.logging_config import get_logger
+from app.shared_state import init_shared_state
+
+logger = get_logger("server")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run NarraFlow with multiple workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))),
+        help="Number of worker processes (default: WEB_CONCURRENCY or CPU count)",
+    )
+    parser.add_argument(
+        "--graceful-timeout",
+        type=int,
+        default=int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+        help="Seconds to let in-flight requests drain after SIGTERM",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+
+    # Create the shared database once, before workers race to open it
+    init_shared_state()
+
+    logger.info(f"Starting {args.workers} workers on {args.host}:{args.port}")
+    # On SIGTERM uvicorn stops accepting connections and waits up to
+    # timeout_graceful_shutdown for in-flight requests in every worker
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
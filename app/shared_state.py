@@ -0,0 +1,221 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import asyncio
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+from app.logging_config import get_logger
+
+logger = get_logger("shared_state")
+
+# SQLite database shared by all uvicorn workers on this host
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "data/shared_state.db")
+# Each worker deletes expired rows at most this often, piggybacking on writes
+PURGE_INTERVAL = float(os.getenv("SHARED_STATE_PURGE_INTERVAL", "60"))
+
+_local = threading.local()
+_last_purge = 0.0
+
+
+def _connect() -> sqlite3.Connection:
+    """Return this thread's connection, opening it in WAL mode on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        Path(SHARED_STATE_PATH).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(SHARED_STATE_PATH, timeout=5.0, isolation_level=None)
+        # WAL lets readers in every worker proceed while one worker writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "stream TEXT NOT NULL, seq INTEGER NOT NULL, payload TEXT NOT NULL, "
+            "expires_at REAL, PRIMARY KEY (stream, seq))"
+        )
+        _local.conn = conn
+    return conn
+
+
+def init_shared_state() -> None:
+    """Create the database and purge stale entries before workers start."""
+    _connect()
+    purged = purge_expired()
+    logger.info(f"Shared state ready at {SHARED_STATE_PATH} ({purged} expired entries purged)")
+
+
+def _expires_at(ttl: Optional[float]) -> Optional[float]:
+    return time.time() + ttl if ttl else None
+
+
+def _maybe_purge() -> None:
+    """Purge expired rows if this worker hasn't done so for PURGE_INTERVAL."""
+    global _last_purge
+    now = time.time()
+    if now - _last_purge < PURGE_INTERVAL:
+        return
+    _last_purge = now
+    try:
+        purged = purge_expired()
+        if purged:
+            logger.info(f"Purged {purged} expired shared state entries")
+    except sqlite3.Error as e:
+        logger.warning(f"Failed to purge shared state: {e}")
+
+
+def get_value(key: str) -> Optional[Any]:
+    """Get a JSON value by key, or None if missing or expired."""
+    row = _connect().execute(
+        "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+        (key, time.time()),
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def set_value(key: str, value: Any, ttl: Optional[float] = None) -> None:
+    """Store a JSON-serializable value, optionally expiring after ttl seconds."""
+    _connect().execute(
+        "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+        (key, json.dumps(value), _expires_at(ttl)),
+    )
+    _maybe_purge()
+
+
+def _stream_key(stream: str) -> str:
+    return f"stream:{stream}"
+
+
+def acquire_lease(name: str, owner: str, ttl: float) -> bool:
+    """Take a cross-worker lease unless another owner holds an unexpired one."""
+    key = f"lease:{name}"
+    conn = _connect()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, now),
+        ).fetchone()
+        if row and json.loads(row[0]) != owner:
+            conn.execute("ROLLBACK")
+            return False
+        conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(owner), now + ttl),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return True
+
+
+def release_lease(name: str, owner: str) -> None:
+    _connect().execute(
+        "DELETE FROM kv WHERE key = ? AND value = ?", (f"lease:{name}", json.dumps(owner))
+    )
+
+
+def append_event(stream: str, payload: Any, ttl: Optional[float] = None) -> int:
+    """Append a JSON payload to an event stream and return its sequence number.
+
+    Sequence numbers start at 1 and increase by one per stream. Once a stream
+    has expired it restarts at 1 under a new epoch, so readers can tell a
+    restarted log from one they have already consumed.
+    """
+    conn = _connect()
+    key = _stream_key(stream)
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, now),
+        ).fetchone()
+        if row:
+            position = json.loads(row[0])
+        else:
+            position = {"epoch": uuid.uuid4().hex, "seq": 0}
+            conn.execute("DELETE FROM events WHERE stream = ?", (stream,))
+        position["seq"] += 1
+        conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(position), _expires_at(ttl)),
+        )
+        conn.execute(
+            "INSERT INTO events (stream, seq, payload, expires_at) VALUES (?, ?, ?, ?)",
+            (stream, position["seq"], json.dumps(payload), _expires_at(ttl)),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    _maybe_purge()
+    return position["seq"]
+
+
+def read_events(stream: str, after_seq: int = 0, limit: int = 500) -> List[Tuple[int, Any]]:
+    """Return (seq, payload) pairs with seq greater than after_seq, oldest first."""
+    rows = _connect().execute(
+        "SELECT seq, payload FROM events WHERE stream = ? AND seq > ? "
+        "AND (expires_at IS NULL OR expires_at > ?) ORDER BY seq LIMIT ?",
+        (stream, after_seq, time.time(), limit),
+    ).fetchall()
+    return [(seq, json.loads(payload)) for seq, payload in rows]
+
+
+def stream_position(stream: str) -> Tuple[Optional[str], int]:
+    """Return (epoch, last seq) of a stream, or (None, 0) if it has expired."""
+    position = get_value(_stream_key(stream))
+    if position is None:
+        return None, 0
+    return position["epoch"], position["seq"]
+
+
+def purge_expired() -> int:
+    """Delete expired entries and events and return how many were removed."""
+    conn = _connect()
+    now = time.time()
+    removed = conn.execute(
+        "DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+    ).rowcount
+    removed += conn.execute(
+        "DELETE FROM events WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+    ).rowcount
+    return removed
+
+
+async def aget_value(key: str) -> Optional[Any]:
+    return await asyncio.to_thread(get_value, key)
+
+
+async def aset_value(key: str, value: Any, ttl: Optional[float] = None) -> None:
+    await asyncio.to_thread(set_value, key, value, ttl)
+
+
+async def aappend_event(stream: str, payload: Any, ttl: Optional[float] = None) -> int:
+    return await asyncio.to_thread(append_event, stream, payload, ttl)
+
+
+async def aread_events(stream: str, after_seq: int = 0, limit: int = 500) -> List[Tuple[int, Any]]:
+    return await asyncio.to_thread(read_events, stream, after_seq, limit)
+
+
+async def astream_position(stream: str) -> Tuple[Optional[str], int]:
+    return await asyncio.to_thread(stream_position, stream)
+
+
+async def aacquire_lease(name: str, owner: str, ttl: float) -> bool:
+    return await asyncio.to_thread(acquire_lease, name, owner, ttl)
+
+
+async def arelease_lease(name: str, owner: str) -> None:
+    await asyncio.to_thread(release_lease, name, owner)
@@ -0,0 +1,477 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi import WebSocket
+
+from app.image_gen import (
+    generate_image,
+    generate_image_comfy,
+    generate_prompt,
+    render_comfy_workflow,
+)
+from app.llm import build_user_message, process_chat
+from app.logging_config import get_logger
+from app.models import (
+    ImageGenerationRequest,
+    LLMMessage,
+    Message,
+    NARRATION_SKIP_AUTHORS,
+    NarrationRequest,
+    NewChatMessage,
+    StoryConfigureCommand,
+    StoryImageCommand,
+    StorySessionConfig,
+    StoryTurnCommand,
+)
+from app.narration import narrate_turn
+from app.shared_state import (
+    aacquire_lease,
+    aappend_event,
+    aget_value,
+    aread_events,
+    arelease_lease,
+    aset_value,
+    astream_position,
+)
+
+logger = get_logger("story_channel")
+
+# Session state and event logs outlive a connection so clients can resume
+STORY_SESSION_TTL = float(os.getenv("STORY_SESSION_TTL", "86400"))
+# How often a connection checks the shared log for events from other workers
+EVENT_POLL_INTERVAL = float(os.getenv("STORY_EVENT_POLL_INTERVAL", "0.5"))
+# Upper bound on how long a crashed worker can keep a session locked
+STORY_LOCK_TTL = float(os.getenv("STORY_LOCK_TTL", "300"))
+LOCK_RETRY_INTERVAL = 0.1
+
+# Connections in this worker, woken whenever this worker emits an event
+_listeners: Dict[str, Set[asyncio.Event]] = defaultdict(set)
+# Keeps same-worker commands in arrival order; entries live while in use
+_session_locks: Dict[str, asyncio.Lock] = {}
+_session_lock_users: Dict[str, int] = {}
+# Keep references so running turns aren't garbage collected on disconnect
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _stream(session_id: str) -> str:
+    return f"story:{session_id}:events"
+
+
+def _session_key(session_id: str) -> str:
+    return f"story:{session_id}:session"
+
+
+async def _load_session(session_id: str) -> Optional[dict]:
+    return await aget_value(_session_key(session_id))
+
+
+async def _save_session(session_id: str, session: dict) -> None:
+    await aset_value(_session_key(session_id), session, ttl=STORY_SESSION_TTL)
+
+
+def _bump_version(session: dict) -> int:
+    """Mark a change to the session's history, so older client snapshots are stale"""
+    session["version"] = session.get("version", 0) + 1
+    return session["version"]
+
+
+@asynccontextmanager
+async def session_lock(session_id: str):
+    """Serialize updates to a session's state across all workers.
+
+    A local lock keeps this worker's commands in arrival order; a lease in
+    the shared state keeps other workers out while it is held.
+    """
+    lock = _session_locks.setdefault(session_id, asyncio.Lock())
+    _session_lock_users[session_id] = _session_lock_users.get(session_id, 0) + 1
+    try:
+        async with lock:
+            owner = uuid.uuid4().hex
+            while not await aacquire_lease(_session_key(session_id), owner, STORY_LOCK_TTL):
+                await asyncio.sleep(LOCK_RETRY_INTERVAL)
+            try:
+                yield
+            finally:
+                await arelease_lease(_session_key(session_id), owner)
+    finally:
+        _session_lock_users[session_id] -= 1
+        if not _session_lock_users[session_id]:
+            del _session_lock_users[session_id]
+            del _session_locks[session_id]
+
+
+async def emit(session_id: str, event_type: str, data: Dict[str, Any]) -> int:
+    """Append an event to the session log and wake this worker's connections"""
+    seq = await aappend_event(
+        _stream(session_id), {"type": event_type, "data": data}, ttl=STORY_SESSION_TTL
+    )
+    for wakeup in _listeners.get(session_id, ()):
+        wakeup.set()
+    return seq
+
+
+def _log_task_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception():
+        logger.error(f"Story task failed: {task.exception()!r}")
+
+
+def _spawn(coro) -> None:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    task.add_done_callback(_log_task_failure)
+
+
+async def _generate_image(
+    session_id: str,
+    history: List[dict],
+    image_history: List[dict],
+    config: StorySessionConfig,
+) -> None:
+    """Render an image for a history snapshot without holding the session lock"""
+    try:
+        await emit(session_id, "image_progress", {"stage": "prompt"})
+        image_request = ImageGenerationRequest(
+            history=history,
+            imageHistory=image_history,
+            systemPrompt=config.imagePrompt,
+        )
+        prompt = await generate_prompt(image_request)
+
+        await emit(session_id, "image_progress", {"stage": "render", "prompt": prompt.positive})
+        if config.imageMode == "comfy":
+            workflow_json = render_comfy_workflow(
+                config.workflow,
+                prompt,
+                config.positivePromptPlaceholder,
+                config.negativePromptPlaceholder,
+            )
+            urls = await generate_image_comfy(workflow_json)
+        else:
+            urls = await generate_image(prompt)
+
+        # Re-load so edits made during the render are kept; only append images
+        timestamp = int(time.time() * 1000)
+        async with session_lock(session_id):
+            session = await _load_session(session_id)
+            version = None
+            if session is not None:
+                session["imageHistory"].extend(
+                    {"url": url, "prompt": prompt.positive, "timestamp": timestamp}
+                    for url in urls
+                )
+                version = _bump_version(session)
+                await _save_session(session_id, session)
+            # Emitted under the lock so a configure can't be checked against
+            # this version before the client has seen the images
+            await emit(
+                session_id,
+                "image_ready",
+                {"urls": urls, "prompt": prompt.positive, "version": version},
+            )
+    except Exception as e:
+        logger.error(f"Error generating image for session {session_id}: {str(e)}")
+        await emit(session_id, "error", {"stage": "image", "detail": str(e)})
+
+
+def _is_narrated(message: LLMMessage, config: StorySessionConfig) -> bool:
+    return config.narrate and message.author.lower() not in NARRATION_SKIP_AUTHORS
+
+
+async def _narrate(
+    session_id: str, turn_id: str, messages: List[LLMMessage], config: StorySessionConfig
+) -> None:
+    """Push audio for each narrated message, then `audio_complete` for the turn"""
+    try:
+        narration = await narrate_turn(
+            NarrationRequest(
+                messages=[Message(**message.model_dump()) for message in messages],
+                voices=config.voices,
+                stitch="message",
+            )
+        )
+        for clip in narration.playlist:
+            await emit(
+                session_id,
+                "audio_ready",
+                {
+                    "turnId": turn_id,
+                    "content": messages[clip.messageIndex].content,
+                    "author": clip.author,
+                    "url": clip.url,
+                },
+            )
+    except Exception as e:
+        logger.error(f"Error narrating turn for session {session_id}: {str(e)}")
+        await emit(session_id, "error", {"stage": "audio", "detail": str(e)})
+    finally:
+        # Lets clients stop waiting on messages whose clip was dropped
+        await emit(session_id, "audio_complete", {"turnId": turn_id})
+
+
+async def run_turn(session_id: str, command: StoryTurnCommand) -> None:
+    """Continue the story and push messages, keywords, image and audio as they are ready.
+
+    The session is locked only while the chat response is produced; image and
+    narration follow after `turn_complete`, so the next turn can start. Every
+    turn ends with either `turn_complete` or a chat `error`.
+    """
+    turn_id = uuid.uuid4().hex
+    try:
+        async with session_lock(session_id):
+            session = await _load_session(session_id)
+            if session is None:
+                raise ValueError("Session is not configured")
+            config = StorySessionConfig(**session["config"])
+            chat_message = NewChatMessage(
+                content=command.content,
+                author=command.author,
+                history=session["history"],
+                selectedKeywords=command.selectedKeywords,
+                systemPrompt=config.storytellerPrompt,
+            )
+            await emit(session_id, "turn_started", {"turnId": turn_id})
+
+            response = await process_chat(chat_message)
+            # Only generated messages are narrated, not the echoed user input
+            generated = list(response.messages)
+            messages = [build_user_message(chat_message), *generated]
+            session["history"].extend(message.model_dump() for message in messages)
+            version = _bump_version(session)
+            # Save before announcing, so nothing is emitted that a crash could lose
+            await _save_session(session_id, session)
+
+            for index, message in enumerate(messages):
+                await emit(
+                    session_id,
+                    "message",
+                    {
+                        "turnId": turn_id,
+                        "message": message.model_dump(),
+                        # Index 0 is the echoed user input, which is never narrated
+                        "narrated": index > 0 and _is_narrated(message, config),
+                        "version": version,
+                    },
+                )
+            await emit(
+                session_id,
+                "keywords",
+                {"keywords": [kw.model_dump() for kw in response.keywords]},
+            )
+            await emit(session_id, "turn_complete", {})
+    except Exception as e:
+        logger.error(f"Error processing turn for session {session_id}: {str(e)}")
+        await emit(session_id, "error", {"stage": "chat", "detail": str(e)})
+        return
+
+    followups = []
+    if command.generateImage:
+        followups.append(
+            _generate_image(session_id, session["history"], session["imageHistory"], config)
+        )
+    if config.narrate:
+        followups.append(_narrate(session_id, turn_id, generated, config))
+    await asyncio.gather(*followups)
+
+
+async def run_image(session_id: str) -> None:
+    try:
+        session = await _load_session(session_id)
+        if session is None:
+            raise ValueError("Session is not configured")
+        config = StorySessionConfig(**session["config"])
+    except Exception as e:
+        logger.error(f"Error loading session {session_id} for image: {str(e)}")
+        await emit(session_id, "error", {"stage": "image", "detail": str(e)})
+        return
+    await _generate_image(session_id, session["history"], session["imageHistory"], config)
+
+
+async def configure_session(session_id: str, command: StoryConfigureCommand) -> None:
+    """Replace the session's config and history with the client's snapshot.
+
+    A snapshot taken before the latest turn or image is rejected as stale
+    rather than overwriting it; the client resyncs once it has caught up.
+    """
+    try:
+        async with session_lock(session_id):
+            session = await _load_session(session_id)
+            current_version = session.get("version", 0) if session is not None else 0
+            if session is not None and command.baseVersion != current_version:
+                await emit(
+                    session_id,
+                    "error",
+                    {
+                        "stage": "configure",
+                        "detail": "Session changed since this snapshot was taken",
+                        "stale": True,
+                        "version": current_version,
+                        "requestId": command.requestId,
+                    },
+                )
+                return
+
+            session = {
+                "config": command.config.model_dump(),
+                "history": [message.model_dump() for message in command.history],
+                "imageHistory": command.imageHistory,
+                "version": current_version,
+            }
+            version = _bump_version(session)
+            await _save_session(session_id, session)
+            await emit(
+                session_id, "configured", {"version": version, "requestId": command.requestId}
+            )
+    except Exception as e:
+        logger.error(f"Error configuring session {session_id}: {str(e)}")
+        await emit(session_id, "error", {"stage": "configure", "detail": str(e)})
+
+
+def _handle_command(session_id: str, payload: Any) -> None:
+    command_type = payload.get("type") if isinstance(payload, dict) else None
+
+    # Commands are validated here but run as tasks, queued on the session lock
+    # in arrival order, so a long turn never blocks the receive loop
+    if command_type == "configure":
+        _spawn(configure_session(session_id, StoryConfigureCommand(**payload)))
+    elif command_type == "turn":
+        _spawn(run_turn(session_id, StoryTurnCommand(**payload)))
+    elif command_type == "image":
+        StoryImageCommand(**payload)
+        _spawn(run_image(session_id))
+    else:
+        raise ValueError(f"Unknown command type: {command_type}")
+
+
+async def _send(websocket: WebSocket, send_lock: asyncio.Lock, payload: dict) -> None:
+    async with send_lock:
+        await websocket.send_json(payload)
+
+
+async def _send_session(
+    websocket: WebSocket,
+    send_lock: asyncio.Lock,
+    session_id: str,
+    epoch: Optional[str],
+    resume_from: int,
+) -> None:
+    """Tell the client which log epoch it is reading and where delivery resumes"""
+    session = await _load_session(session_id)
+    await _send(
+        websocket,
+        send_lock,
+        {
+            "type": "session",
+            "data": {
+                "configured": session is not None,
+                "epoch": epoch,
+                "resumeFrom": resume_from,
+            },
+        },
+    )
+
+
+async def _pump_events(
+    websocket: WebSocket,
+    send_lock: asyncio.Lock,
+    session_id: str,
+    epoch: Optional[str],
+    last_seq: int,
+    wakeup: asyncio.Event,
+) -> None:
+    """Forward logged events after last_seq to the client, in order"""
+    stream = _stream(session_id)
+    while True:
+        wakeup.clear()
+        current_epoch, _ = await astream_position(stream)
+        if current_epoch is not None and current_epoch != epoch:
+            # A new log started: replay it from the start unless it is the
+            # first log this connection has seen, which it already reads from 0
+            if epoch is not None:
+                last_seq = 0
+            epoch = current_epoch
+            await _send_session(websocket, send_lock, session_id, epoch, last_seq)
+
+        events = await aread_events(stream, last_seq)
+        for seq, event in events:
+            await _send(websocket, send_lock, {"seq": seq, **event})
+            last_seq = seq
+        if events:
+            continue
+
+        try:
+            await asyncio.wait_for(wakeup.wait(), EVENT_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _receive_commands(
+    websocket: WebSocket, send_lock: asyncio.Lock, session_id: str
+) -> None:
+    """Dispatch client commands until the client disconnects"""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+        try:
+            if message.get("text") is None:
+                raise ValueError("Commands must be sent as JSON text frames")
+            _handle_command(session_id, json.loads(message["text"]))
+        except ValueError as e:
+            # Malformed or invalid commands are reported to this client only
+            await _send(
+                websocket,
+                send_lock,
+                {"type": "error", "data": {"stage": "command", "detail": str(e)}},
+            )
+
+
+async def story_channel(
+    websocket: WebSocket, session_id: str, last_seq: int = 0, epoch: Optional[str] = None
+) -> None:
+    """Serve one story session over a WebSocket.
+
+    Events carry a per-session `seq` within a log `epoch`; reconnecting with
+    both replays everything the client missed, even if another worker
+    produced it. If the log has since restarted, it is replayed from the start.
+    """
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+    current_epoch, _ = await astream_position(_stream(session_id))
+    if epoch is None or epoch != current_epoch:
+        last_seq = 0
+    await _send_session(websocket, send_lock, session_id, current_epoch, last_seq)
+    logger.info(f"Story channel opened for session {session_id} (last_seq={last_seq})")
+
+    wakeup = asyncio.Event()
+    _listeners[session_id].add(wakeup)
+    receiver = asyncio.create_task(_receive_commands(websocket, send_lock, session_id))
+    pump = asyncio.create_task(
+        _pump_events(websocket, send_lock, session_id, current_epoch, last_seq, wakeup)
+    )
+    try:
+        # The pump only returns by failing; either way the connection is over
+        done, _ = await asyncio.wait({receiver, pump}, return_when=asyncio.FIRST_COMPLETED)
+        failed = [task for task in done if not task.cancelled() and task.exception()]
+        if failed:
+            logger.error(
+                f"Story channel failed for session {session_id}: {failed[0].exception()!r}"
+            )
+            try:
+                await websocket.close(code=1011)
+            except Exception:
+                pass
+        else:
+            logger.info(f"Story channel closed for session {session_id}")
+    finally:
+        receiver.cancel()
+        pump.cancel()
+        _listeners[session_id].discard(wakeup)
+        if not _listeners[session_id]:
+            del _listeners[session_id]
@@ -74,3 +74,143 @@ export async function generateImage(history, imageHistory) {
     throw error;
   }
 }
+
+export async function generateNarration(messages, stitch = 'message') {
+  try {
+    const voices = JSON.parse(localStorage.getItem('narrationVoices') || '{}');
+    const response = await fetch('/api/narration/generate', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ messages, voices, stitch })
+    });
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(errorText);
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Failed to generate narration:', error);
+    throw error;
+  }
+}
+
+// One WebSocket per story session. The server keeps the config and history,
+// so each turn only sends the new input. Events carry a sequence number within
+// a log epoch, used to resume after a reconnect without losing or repeating
+// events; when the server's log restarts it announces a new epoch.
+export class StoryChannel {
+  constructor(sessionId, handlers) {
+    this.sessionId = sessionId;
+    this.handlers = handlers;
+    this.lastSeq = Number(localStorage.getItem(`storyLastSeq:${sessionId}`) || 0);
+    this.epoch = localStorage.getItem(`storyEpoch:${sessionId}`);
+    // Server-side history version the local state reflects
+    this.version = Number(localStorage.getItem(`storyVersion:${sessionId}`) || 0);
+    this.configureId = null;
+    this.pending = [];
+    this.isReady = false;
+    this.isClosed = false;
+    this.reconnectDelay = 1000;
+  }
+
+  connect() {
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const params = new URLSearchParams({ last_seq: this.lastSeq });
+    if (this.epoch) params.set('epoch', this.epoch);
+    const url = `${protocol}://${window.location.host}/ws/story/${encodeURIComponent(this.sessionId)}?${params}`;
+    this.socket = new WebSocket(url);
+
+    this.socket.onopen = () => {
+      this.reconnectDelay = 1000;
+    };
+
+    this.socket.onmessage = (event) => {
+      try {
+        this.handleEvent(JSON.parse(event.data));
+      } catch (error) {
+        console.error('Failed to handle story event:', error);
+      }
+    };
+
+    this.socket.onclose = () => {
+      this.isReady = false;
+      if (this.isClosed) return;
+      console.log(`Story channel closed, reconnecting in ${this.reconnectDelay}ms`);
+      setTimeout(() => this.connect(), this.reconnectDelay);
+      this.reconnectDelay = Math.min(this.reconnectDelay * 2, 30000);
+    };
+  }
+
+  handleEvent(event) {
+    if (event.seq) {
+      // Skip anything already handled before a reconnect
+      if (event.seq <= this.lastSeq) return;
+      this.lastSeq = event.seq;
+      localStorage.setItem(`storyLastSeq:${this.sessionId}`, String(event.seq));
+    }
+
+    if (event.type === 'session') {
+      // The server says which log it is reading and where delivery resumes
+      this.epoch = event.data.epoch;
+      this.lastSeq = event.data.resumeFrom;
+      if (this.epoch) {
+        localStorage.setItem(`storyEpoch:${this.sessionId}`, this.epoch);
+      } else {
+        localStorage.removeItem(`storyEpoch:${this.sessionId}`);
+      }
+      localStorage.setItem(`storyLastSeq:${this.sessionId}`, String(this.lastSeq));
+      this.isReady = true;
+      this.handlers.session?.(event.data);
+      this.pending.splice(0).forEach(command => this.send(command));
+      return;
+    }
+
+    if (typeof event.data?.version === 'number') {
+      // Events arrive in log order, so the latest version covers all changes seen so far
+      this.version = event.data.version;
+      localStorage.setItem(`storyVersion:${this.sessionId}`, String(this.version));
+    }
+
+    this.handlers[event.type]?.(event.data);
+  }
+
+  send(command) {
+    if (this.isReady && this.socket?.readyState === WebSocket.OPEN) {
+      this.socket.send(JSON.stringify(command));
+    } else {
+      this.pending.push(command);
+    }
+  }
+
+  configure(config, history, imageHistory) {
+    this.configureId = crypto.randomUUID();
+    this.send({
+      type: 'configure',
+      config,
+      history,
+      imageHistory,
+      baseVersion: this.version,
+      requestId: this.configureId
+    });
+  }
+
+  sendTurn(content, author, selectedKeywords, generateImage) {
+    this.send({ type: 'turn', content, author, selectedKeywords, generateImage });
+  }
+
+  requestImage() {
+    this.send({ type: 'image' });
+  }
+
+  close() {
+    this.isClosed = true;
+    localStorage.removeItem(`storyLastSeq:${this.sessionId}`);
+    localStorage.removeItem(`storyEpoch:${this.sessionId}`);
+    localStorage.removeItem(`storyVersion:${this.sessionId}`);
+    this.socket?.close();
+  }
+}
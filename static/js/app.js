@@ -1,8 +1,9 @@
-import { sendMessage, generateImage } from './api.js';
+import { sendMessage, generateImage, generateNarration, StoryChannel } from './api.js';
 
 // Export API functions for use in Alpine components
 window.sendMessage = sendMessage;
 window.generateImage = generateImage;
+window.generateNarration = generateNarration;
 
 document.addEventListener('alpine:init', () => {
   Alpine.store('app', {
@@ -12,6 +13,9 @@ document.addEventListener('alpine:init', () => {
     keywords: [],
     selectedKeywords: [],
     audioCache: new Map(),
+    audioRequests: new Map(), // In-flight audio URL promises keyed by message text
+    audioPlayRequests: new Set(), // Messages whose play click is waiting on audio
+    narrationWaiters: new Map(), // Server-side narration pending per message text
     audioPlayers: new Map(), // Track audio elements and their states
     commandHistory: [],
     historyIndex: -1,
@@ -24,6 +28,7 @@ document.addEventListener('alpine:init', () => {
       comfyWorkflow: localStorage.getItem('comfyWorkflow') || '{\n  \n}',
       positivePromptPlaceholder: localStorage.getItem('positivePromptPlaceholder') || '{positive_prompt}',
       negativePromptPlaceholder: localStorage.getItem('negativePromptPlaceholder') || '{negative_prompt}',
+      narrateTurns: localStorage.getItem('narrateTurns') !== 'false',
       savedConfigs: JSON.parse(localStorage.getItem('savedConfigs')) || [],
       selectedConfigIndex: -1
     },
@@ -61,6 +66,7 @@ document.addEventListener('alpine:init', () => {
 
       // Save to storage
       this.saveState();
+      this.syncStoryChannel();
     },
 
     cancelEdit() {
@@ -78,6 +84,10 @@ document.addEventListener('alpine:init', () => {
 
     imageGenerationMode: localStorage.getItem('imageGenerationMode') || 'regular',
 
+    // 'websocket' keeps one story channel open instead of a request per turn
+    storyTransport: localStorage.getItem('storyTransport') || 'http',
+    storyChannel: null,
+
     init() {
       this.loadFromStorage();
       window.editor.setValue(this.config.comfyWorkflow);
@@ -85,6 +95,10 @@ document.addEventListener('alpine:init', () => {
       this.setupAuthorSelector();
       this.renderKeywords();
 
+      if (this.storyTransport === 'websocket') {
+        this.connectStoryChannel();
+      }
+
       // Start periodic generation if enabled
       if (this.imageSettings.enabled && this.imageSettings.mode === 'periodic') {
         this.startPeriodicImageGeneration();
@@ -99,6 +113,121 @@ document.addEventListener('alpine:init', () => {
       this.currentInput = '';
       this.selectedAuthor = 'narrator';
       this.saveState();
+
+      // A cleared story starts a fresh server-side session
+      if (this.storyChannel) {
+        this.storyChannel.close();
+        localStorage.removeItem('storySessionId');
+        this.connectStoryChannel();
+      }
+    },
+
+    connectStoryChannel() {
+      let sessionId = localStorage.getItem('storySessionId');
+      if (!sessionId) {
+        sessionId = crypto.randomUUID();
+        localStorage.setItem('storySessionId', sessionId);
+      }
+
+      this.storyChannel = new StoryChannel(sessionId, {
+        session: (data) => {
+          if (!data.configured) this.syncStoryChannel();
+        },
+        message: (data) => {
+          if (data.narrated) {
+            this.awaitServerNarration(data.turnId, data.message.content);
+          }
+          this.chatHistory.push(data.message);
+          this.saveState();
+          this.updateAuthorSelector();
+          this.scrollChatToBottom();
+        },
+        keywords: (data) => {
+          this.keywords = data.keywords;
+          this.selectedKeywords = [];
+          this.saveState();
+          this.renderKeywords();
+        },
+        image_ready: (data) => {
+          data.urls.forEach(url => {
+            this.imageHistory.push({
+              url: url,
+              prompt: data.prompt,
+              timestamp: Date.now()
+            });
+          });
+          this.lastImageGeneration = Date.now();
+          this.saveState();
+          window.dispatchEvent(new CustomEvent('images-changed'));
+        },
+        audio_ready: (data) => {
+          const waiter = this.narrationWaiters.get(data.content);
+          if (waiter) {
+            this.narrationWaiters.delete(data.content);
+            waiter.resolve(data.url);
+          } else {
+            this.audioCache.set(data.content, data.url);
+          }
+        },
+        audio_complete: (data) => {
+          // Messages left without a clip fall back to on-demand generation
+          this.narrationWaiters.forEach((waiter, content) => {
+            if (waiter.turnId === data.turnId) {
+              this.narrationWaiters.delete(content);
+              waiter.reject(new Error('No narration clip for message'));
+            }
+          });
+        },
+        turn_complete: () => {
+          this.isProcessing = false;
+          this.updateSendButtonState();
+        },
+        error: (data) => {
+          if (data.stale) {
+            // A turn or image landed first; its events are already applied, so resend
+            if (data.requestId === this.storyChannel.configureId) this.syncStoryChannel();
+            return;
+          }
+          console.error('Story channel error:', data);
+          if (data.stage === 'chat' || data.stage === 'command') {
+            this.isProcessing = false;
+            this.updateSendButtonState();
+          }
+          if (data.stage === 'configure') {
+            this.showError('Failed to save story settings');
+          } else if (data.stage !== 'audio') {
+            this.showError(`Failed to generate ${data.stage === 'image' ? 'image' : 'response'}`);
+          }
+        }
+      });
+      this.storyChannel.connect();
+    },
+
+    // Send the current config and history; only needed when they change
+    syncStoryChannel() {
+      if (!this.storyChannel) return;
+
+      let workflow = {};
+      try {
+        workflow = JSON.parse(this.config.comfyWorkflow || '{}');
+      } catch (e) {
+        console.error('Invalid ComfyUI workflow JSON:', e);
+      }
+
+      this.storyChannel.configure(
+        {
+          storytellerPrompt: this.config.storytellerPrompt,
+          imagePrompt: this.config.imagePrompt,
+          imageMode: this.imageGenerationMode,
+          workflow: workflow,
+          positivePromptPlaceholder: this.config.positivePromptPlaceholder || '{positive_prompt}',
+          negativePromptPlaceholder: this.config.negativePromptPlaceholder || '{negative_prompt}',
+          narrate: this.config.narrateTurns,
+          voices: JSON.parse(localStorage.getItem('narrationVoices') || '{}')
+        },
+        this.chatHistory,
+        this.imageHistory
+      );
     },
 
     setupAuthorSelector() {
@@ -173,11 +302,13 @@ document.addEventListener('alpine:init', () => {
     deleteMessage(index) {
       this.chatHistory.splice(index, 1);
       this.saveState();
+      this.syncStoryChannel();
     },
 
     deleteImage(index) {
       this.imageHistory.splice(index, 1);
       this.saveState();
+      this.syncStoryChannel();
       // Dispatch custom event when images are updated
       window.dispatchEvent(new CustomEvent('images-changed'));
     },
@@ -207,6 +338,7 @@ document.addEventListener('alpine:init', () => {
     toggleImageMode(mode) {
       this.imageGenerationMode = mode;
       localStorage.setItem('imageGenerationMode', mode);
+      this.syncStoryChannel();
     },
 
     loadFromStorage() {
@@ -223,6 +355,7 @@ document.addEventListener('alpine:init', () => {
         this.config.comfyWorkflow = localStorage.getItem('comfyWorkflow') || '';
         this.config.positivePromptPlaceholder = localStorage.getItem('positivePromptPlaceholder') || '';
         this.config.negativePromptPlaceholder = localStorage.getItem('negativePromptPlaceholder') || '';
+        this.config.narrateTurns = localStorage.getItem('narrateTurns') !== 'false';
       } catch (error) {
         console.error('Failed to load state:', error);
       }
@@ -253,6 +386,8 @@ document.addEventListener('alpine:init', () => {
       localStorage.setItem('comfyWorkflow', this.config.comfyWorkflow);
       localStorage.setItem('positivePromptPlaceholder', this.config.positivePromptPlaceholder);
       localStorage.setItem('negativePromptPlaceholder', this.config.negativePromptPlaceholder);
+      localStorage.setItem('narrateTurns', String(this.config.narrateTurns));
+      this.syncStoryChannel();
       this.closeConfig();
     },
 
@@ -337,6 +472,20 @@ document.addEventListener('alpine:init', () => {
 
       if (!this.isMessageValid() || this.isProcessing) return;
 
+      if (this.storyChannel) {
+        // Results arrive as story channel events; turn_complete ends processing
+        this.isProcessing = true;
+        this.storyChannel.sendTurn(
+          this.currentInput,
+          author,
+          this.selectedKeywords,
+          this.imageSettings.enabled && this.imageSettings.mode === 'after_chat'
+        );
+        this.currentInput = '';
+        this.updateSendButtonState();
+        return;
+      }
+
       try {
         this.isProcessing = true;
 
@@ -352,6 +501,12 @@ document.addEventListener('alpine:init', () => {
             this.chatHistory.push(message);
           });
 
+          // Synthesize audio in the background so it's ready before playback;
+          // the first message echoes the user's own input, so skip it
+          if (this.config.narrateTurns) {
+            this.prewarmNarration(response.llm_response.messages.slice(1));
+          }
+
           this.keywords = response.llm_response.keywords;
           this.selectedKeywords = [];
           this.saveState();
@@ -416,6 +571,11 @@ document.addEventListener('alpine:init', () => {
         }
       }
 
+      if (this.storyChannel) {
+        this.storyChannel.requestImage();
+        return;
+      }
+
       try {
         const response = await generateImage(this.chatHistory, this.imageHistory);
         if (response?.urls && response.urls.length > 0) {
@@ -637,6 +797,87 @@ document.addEventListener('alpine:init', () => {
       }
     },
 
+    prewarmNarration(messages) {
+      // Only narrate messages that have no cached or in-flight audio yet
+      const pending = messages.filter(message =>
+        !['thoughts', 'system'].includes(message.author) &&
+        message.content &&
+        !this.audioCache.has(message.content)
+      );
+      if (pending.length === 0) return;
+
+      const narration = generateNarration(pending);
+      pending.forEach((message, index) => {
+        const request = narration.then(response => {
+          const clip = response.playlist.find(clip => clip.messageIndex === index);
+          if (!clip) {
+            throw new Error('No narration clip for message');
+          }
+          return clip.url;
+        });
+        this.trackAudioRequest(message.content, request)
+          .catch(error => console.error('Failed to prewarm narration:', error));
+      });
+    },
+
+    // Register narration the server is producing, so clicks wait for it
+    awaitServerNarration(turnId, text) {
+      if (this.audioCache.has(text)) return;
+      const request = new Promise((resolve, reject) => {
+        this.narrationWaiters.set(text, { turnId, resolve, reject });
+      });
+      this.trackAudioRequest(text, request)
+        .catch(error => console.warn('Server narration unavailable:', error));
+    },
+
+    // Cache the URL once the request resolves, clearing the loading state either way
+    trackAudioRequest(text, request) {
+      this.audioCache.set(text, 'loading');
+      const tracked = request
+        .then(url => {
+          this.audioCache.set(text, url);
+          return url;
+        })
+        .catch(error => {
+          this.audioCache.delete(text);
+          throw error;
+        })
+        .finally(() => this.audioRequests.delete(text));
+      this.audioRequests.set(text, tracked);
+      return tracked;
+    },
+
+    async resolveMessageAudio(text) {
+      const cachedUrl = this.audioCache.get(text);
+      if (cachedUrl && cachedUrl !== 'loading') {
+        return cachedUrl;
+      }
+
+      // Wait for prewarmed narration, falling back to on-demand generation
+      if (this.audioRequests.has(text)) {
+        try {
+          return await this.audioRequests.get(text);
+        } catch (error) {
+          console.warn('Prewarmed audio failed, generating on demand:', error);
+        }
+      }
+
+      const request = fetch('/api/audio/generate', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ text })
+      }).then(async response => {
+        if (!response.ok) {
+          throw new Error('Failed to generate audio');
+        }
+        const data = await response.json();
+        return data.url;
+      });
+      return this.trackAudioRequest(text, request);
+    },
+
     async playMessageAudio(text) {
       try {
         // Stop any currently playing audio for this message
@@ -648,42 +889,17 @@ document.addEventListener('alpine:init', () => {
           return;
         }
 
-        // Check if already loading
-        if (this.audioCache.get(text) === 'loading') {
+        // Ignore repeated clicks while this message's audio is on its way
+        if (this.audioPlayRequests.has(text)) {
           return;
         }
 
-        // Check cache first
+        this.audioPlayRequests.add(text);
         let audioUrl;
-        if (this.audioCache.has(text)) {
-          const cachedUrl = this.audioCache.get(text);
-          if (cachedUrl !== 'loading') {
-            audioUrl = cachedUrl;
-          }
-        }
-
-        if (!audioUrl) {
-          // Set loading state
-          this.audioCache.set(text, 'loading');
-
-          // Generate new audio
-          const response = await fetch('/api/audio/generate', {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ text })
-          });
-
-          if (!response.ok) {
-            throw new Error('Failed to generate audio');
-          }
-
-          const data = await response.json();
-          audioUrl = data.url;
-
-          // Cache the URL
-          this.audioCache.set(text, audioUrl);
+        try {
+          audioUrl = await this.resolveMessageAudio(text);
+        } finally {
+          this.audioPlayRequests.delete(text);
         }
 
         // Create and play the audio
@@ -740,8 +956,6 @@ document.addEventListener('alpine:init', () => {
       } catch (error) {
         console.error('Error playing audio:', error);
         this.showError('Failed to play audio');
-        // Clear loading state on error
-        this.audioCache.delete(text);
         this.audioPlayers.delete(text);
       }
     },
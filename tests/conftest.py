@@ -0,0 +1,14 @@
+import pytest
+
+from app import shared_state
+
+
+@pytest.fixture
+def state_db(tmp_path, monkeypatch):
+    """Point shared state at a fresh SQLite file for one test."""
+    monkeypatch.setattr(shared_state, "SHARED_STATE_PATH", str(tmp_path / "state.db"))
+    monkeypatch.setattr(shared_state, "_local", type(shared_state._local)())
+    yield shared_state
+    conn = getattr(shared_state._local, "conn", None)
+    if conn is not None:
+        conn.close()
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from app import narration
+from app.models import Message, NarrationRequest
+from app.narration import chunk_text, split_sentences
+
+
+def test_split_keeps_closing_quote_with_sentence():
+    assert split_sentences('He said "Run!" Then he ran.') == ['He said "Run!"', "Then he ran."]
+
+
+def test_split_on_ellipsis_and_question():
+    assert split_sentences("Wait... what? Yes.") == ["Wait...", "what?", "Yes."]
+
+
+def test_split_keeps_titles_with_names():
+    assert split_sentences("Mr. Smith arrived. Dr. Who left.") == [
+        "Mr. Smith arrived.",
+        "Dr. Who left.",
+    ]
+
+
+def test_split_ignores_decimal_points():
+    assert split_sentences("It cost 3.50 dollars. Fine.") == ["It cost 3.50 dollars.", "Fine."]
+
+
+def test_chunk_fills_up_to_max_chars():
+    # "Aaaa. Bbbb." is exactly 11 characters
+    assert chunk_text("Aaaa. Bbbb.", max_chars=11) == ["Aaaa. Bbbb."]
+    assert chunk_text("Aaaa. Bbbb.", max_chars=10) == ["Aaaa.", "Bbbb."]
+
+
+def test_chunk_keeps_long_sentence_whole():
+    long_sentence = "This sentence is much longer than the limit."
+    assert chunk_text(f"Hi. {long_sentence} Bye.", max_chars=10) == ["Hi.", long_sentence, "Bye."]
+
+
+@pytest.mark.parametrize("value", ["[]", '"abc"', '{"Alice": 1}'])
+def test_invalid_voice_map_falls_back_to_empty(monkeypatch, value):
+    monkeypatch.setenv("NARRATION_VOICE_MAP", value)
+    assert narration._default_voice_map() == {}
+
+
+def test_voice_map_lowercases_authors(monkeypatch):
+    monkeypatch.setenv("NARRATION_VOICE_MAP", '{"Alice": "voice-a"}')
+    assert narration._default_voice_map() == {"alice": "voice-a"}
+
+
+@pytest.fixture
+def fake_tts(monkeypatch):
+    """Stub ElevenLabs and MinIO; texts containing "fail" raise on synthesis."""
+    uploads = []
+
+    def synthesize_speech(text, voice_id=None):
+        if "fail" in text:
+            raise RuntimeError("synthesis failed")
+        return text.encode()
+
+    def upload_audio(audio_bytes):
+        uploads.append(audio_bytes)
+        return f"https://audio/{len(uploads)}.mp3"
+
+    monkeypatch.setattr(narration, "synthesize_speech", synthesize_speech)
+    monkeypatch.setattr(narration, "upload_audio", upload_audio)
+    return uploads
+
+
+def _request(*contents, stitch="message"):
+    return NarrationRequest(
+        messages=[Message(author=f"author{i}", content=c) for i, c in enumerate(contents)],
+        stitch=stitch,
+    )
+
+
+def test_failed_chunk_drops_only_its_message(fake_tts):
+    response = asyncio.run(narration.narrate_turn(_request("One. Two.", "This will fail.", "Three.")))
+    assert [clip.messageIndex for clip in response.playlist] == [0, 2]
+    assert fake_tts == [b"One. Two.", b"Three."]
+
+
+def test_failed_chunk_drops_only_itself_when_unstitched(fake_tts):
+    good = "Good" + " words" * 30 + "."
+    bad = "Then they fail" + " words" * 30 + "."
+    response = asyncio.run(narration.narrate_turn(_request(f"{good} {bad}", stitch="none")))
+    assert [clip.text for clip in response.playlist] == [good]
+
+
+def test_all_chunks_failing_raises(fake_tts):
+    with pytest.raises(RuntimeError, match="synthesis failed"):
+        asyncio.run(narration.narrate_turn(_request("We fail.", "They fail too.")))
@@ -0,0 +1,75 @@
+import time
+
+
+def test_value_expires(state_db):
+    state_db.set_value("key", {"a": 1}, ttl=0.05)
+    assert state_db.get_value("key") == {"a": 1}
+
+    time.sleep(0.1)
+    assert state_db.get_value("key") is None
+
+
+def test_value_without_ttl_persists(state_db):
+    state_db.set_value("key", [1, 2])
+    assert state_db.get_value("key") == [1, 2]
+
+
+def test_events_are_sequenced(state_db):
+    assert state_db.append_event("stream", "a") == 1
+    assert state_db.append_event("stream", "b") == 2
+    assert state_db.append_event("other", "c") == 1
+
+    assert state_db.read_events("stream") == [(1, "a"), (2, "b")]
+    assert state_db.read_events("stream", after_seq=1) == [(2, "b")]
+    assert state_db.stream_position("stream")[1] == 2
+
+
+def test_expired_events_are_not_read(state_db):
+    state_db.append_event("stream", "a", ttl=0.05)
+    time.sleep(0.1)
+
+    assert state_db.read_events("stream") == []
+    assert state_db.stream_position("stream") == (None, 0)
+
+
+def test_expired_stream_restarts_under_new_epoch(state_db):
+    state_db.append_event("stream", "a", ttl=0.05)
+    state_db.append_event("stream", "b", ttl=0.05)
+    old_epoch, _ = state_db.stream_position("stream")
+    time.sleep(0.1)
+
+    assert state_db.append_event("stream", "c", ttl=10) == 1
+    new_epoch, last_seq = state_db.stream_position("stream")
+    assert new_epoch is not None and new_epoch != old_epoch
+    assert last_seq == 1
+    assert state_db.read_events("stream") == [(1, "c")]
+
+
+def test_purge_expired_removes_rows(state_db):
+    state_db.set_value("gone", 1, ttl=0.05)
+    state_db.append_event("stream", "a", ttl=0.05)
+    state_db.set_value("kept", 2)
+    time.sleep(0.1)
+
+    # Expired kv entry, stream position and event
+    assert state_db.purge_expired() == 3
+    assert state_db.get_value("kept") == 2
+
+
+def test_lease_is_exclusive_until_released(state_db):
+    assert state_db.acquire_lease("session", "first", ttl=10)
+    assert not state_db.acquire_lease("session", "second", ttl=10)
+    # The holder can renew its own lease
+    assert state_db.acquire_lease("session", "first", ttl=10)
+
+    state_db.release_lease("session", "second")
+    assert not state_db.acquire_lease("session", "second", ttl=10)
+
+    state_db.release_lease("session", "first")
+    assert state_db.acquire_lease("session", "second", ttl=10)
+
+
+def test_lease_expires(state_db):
+    assert state_db.acquire_lease("session", "first", ttl=0.05)
+    time.sleep(0.1)
+    assert state_db.acquire_lease("session", "second", ttl=10)
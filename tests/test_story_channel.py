@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from app import story_channel
+from app.models import (
+    LLMMessage,
+    LLMResponse,
+    StoryConfigureCommand,
+    StorySessionConfig,
+    StoryTurnCommand,
+)
+
+
+def _events(state_db, session_id):
+    return [event for _, event in state_db.read_events(story_channel._stream(session_id))]
+
+
+def _configure(base_version=0, history=()):
+    return StoryConfigureCommand(
+        type="configure",
+        config=StorySessionConfig(narrate=False),
+        history=[{"author": "narrator", "content": content} for content in history],
+        baseVersion=base_version,
+        requestId="req",
+    )
+
+
+def _turn(content="Hello"):
+    return StoryTurnCommand(
+        type="turn", content=content, author="narrator", selectedKeywords=[], generateImage=False
+    )
+
+
+@pytest.fixture
+def fake_chat(monkeypatch):
+    async def process_chat(chat_message):
+        return LLMResponse(messages=[LLMMessage(author="narrator", content="It rained.")])
+
+    monkeypatch.setattr(story_channel, "process_chat", process_chat)
+
+
+def test_configure_then_turn_bumps_version(state_db, fake_chat):
+    asyncio.run(story_channel.configure_session("s1", _configure(history=["Once."])))
+    asyncio.run(story_channel.run_turn("s1", _turn()))
+
+    session = state_db.get_value(story_channel._session_key("s1"))
+    assert session["version"] == 2
+    assert [m["content"] for m in session["history"]][-1] == "It rained."
+    events = _events(state_db, "s1")
+    assert [e["type"] for e in events] == [
+        "configured",
+        "turn_started",
+        "message",
+        "message",
+        "keywords",
+        "turn_complete",
+    ]
+    assert [e["data"]["narrated"] for e in events if e["type"] == "message"] == [False, False]
+
+
+def test_stale_configure_is_rejected(state_db, fake_chat):
+    asyncio.run(story_channel.configure_session("s1", _configure()))
+    asyncio.run(story_channel.run_turn("s1", _turn()))
+    # Snapshot taken before the turn landed
+    asyncio.run(story_channel.configure_session("s1", _configure(base_version=1)))
+
+    session = state_db.get_value(story_channel._session_key("s1"))
+    assert len(session["history"]) == 2
+    error = _events(state_db, "s1")[-1]
+    assert error["type"] == "error"
+    assert error["data"]["stale"] is True
+    assert error["data"]["version"] == 2
+    assert error["data"]["requestId"] == "req"
+
+    asyncio.run(story_channel.configure_session("s1", _configure(base_version=2)))
+    assert state_db.get_value(story_channel._session_key("s1"))["version"] == 3
+
+
+def test_turn_without_session_reports_error(state_db):
+    asyncio.run(story_channel.run_turn("missing", _turn()))
+    events = _events(state_db, "missing")
+    assert [e["type"] for e in events] == ["error"]
+    assert events[0]["data"]["stage"] == "chat"
+
+
+def test_failed_chat_keeps_history_and_reports_error(state_db, monkeypatch):
+    async def process_chat(chat_message):
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(story_channel, "process_chat", process_chat)
+    asyncio.run(story_channel.configure_session("s1", _configure(history=["Once."])))
+    asyncio.run(story_channel.run_turn("s1", _turn()))
+
+    session = state_db.get_value(story_channel._session_key("s1"))
+    assert session["version"] == 1
+    assert len(session["history"]) == 1
+    assert _events(state_db, "s1")[-1] == {
+        "type": "error",
+        "data": {"stage": "chat", "detail": "provider down"},
+    }